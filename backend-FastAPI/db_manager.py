@@ -4,6 +4,48 @@ import json
 from datetime import datetime
 from typing import List, Dict, Tuple, Any, Optional, Union
 
+# Ubicación predeterminada de la base de datos
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db', 'tables.db')
+
+# Consultas frecuentes: migrations.check_query_plans verifica sus planes
+SELECT_USER_BY_EMAIL = "SELECT * FROM usuarios WHERE email = ?"
+
+# Casi todos los usuarios están activos: recorrer la tabla es más barato que
+# buscar cada fila a través de idx_usuarios_activos
+SELECT_ACTIVE_USERS = "SELECT * FROM usuarios NOT INDEXED WHERE activo = 1"
+
+SELECT_ACTIVE_USER_IDS = "SELECT user_id FROM usuarios WHERE activo = 1"
+
+SELECT_RECOMMENDATIONS = """
+WITH all_similarities AS (
+    SELECT user_id_1 AS user_id, user_id_2 AS other_user_id, score_similitud
+    FROM similitudes
+    WHERE user_id_1 = ?
+    UNION ALL
+    SELECT user_id_2 AS user_id, user_id_1 AS other_user_id, score_similitud
+    FROM similitudes
+    WHERE user_id_2 = ?
+)
+SELECT u.*, s.score_similitud
+FROM all_similarities s
+JOIN usuarios u ON u.user_id = s.other_user_id
+WHERE u.activo = 1
+ORDER BY s.score_similitud DESC
+LIMIT ?
+"""
+
+# Índices secundarios de similitudes (nombre canónico -> columnas). Los crea la
+# migración 1 y rebuild.py los replica en la tabla de staging. Crearlos de nuevo
+# dentro del reemplazo bloquearía las escrituras (~3 s con 1,4M filas), así que
+# cada reconstrucción alterna el sufijo '_b': una migración que los modifique
+# debe contemplar ambos nombres (DROP INDEX IF EXISTS nombre / nombre_b).
+SIMILARITY_INDEXES = {
+    # Cubriente: rama directa del CTE de get_recommendations, ya ordenada por score
+    "idx_similitudes_user1_score": "(user_id_1, score_similitud, user_id_2)",
+    # Cubriente: rama inversa del CTE (WHERE user_id_2 = ?), antes hacía un SCAN completo
+    "idx_similitudes_user2_score": "(user_id_2, score_similitud, user_id_1)",
+}
+
 class DBManager:
     """
     Clase para gestionar la conexión y operaciones con la base de datos SQLite
@@ -18,8 +60,7 @@ class DBManager:
             db_path: Ruta al archivo de base de datos. Si es None, se usará la ubicación predeterminada.
         """
         if db_path is None:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(script_dir, '..', 'db', 'tables.db')
+            db_path = DEFAULT_DB_PATH
             
             # Asegurar que el directorio de la base de datos existe
             os.makedirs(os.path.dirname(db_path), exist_ok=True)
@@ -174,39 +215,39 @@ class DBManager:
         ''')
 
     # place commit after
-def insert_user(self, user_data: Dict[str, Any]) -> int:
-    """
-    Inserta un nuevo usuario en la base de datos y retorna el ID del usuario insertado.
-    
-    Args:
-        user_data: Diccionario con los datos del usuario.
+    def insert_user(self, user_data: Dict[str, Any]) -> int:
+        """
+        Inserta un nuevo usuario en la base de datos y retorna el ID del usuario insertado.
         
-    Returns:
-        ID del usuario insertado.
-    """
-    if not self.conn:
-        self.connect()
+        Args:
+            user_data: Diccionario con los datos del usuario.
+            
+        Returns:
+            ID del usuario insertado.
+        """
+        if not self.conn:
+            self.connect()
 
-    try:
-        # Ejecutar el comando INSERT
-        self.cursor.execute(
-            """
-            INSERT INTO usuarios (
-                nombre, email, telefono, redes_sociales, fecha_nacimiento,
-                genero, ocupacion, deportes, presupuesto_maximo, habitos_limpieza,
-                horario_trabajo, tiene_mascota, acepta_mascota, es_fumador,
-                acepta_fumador, intereses, preferencias_roommate, fecha_registro,
-                ultima_actualizacion, activo
+        try:
+            # Ejecutar el comando INSERT
+            self.cursor.execute(
+                """
+                INSERT INTO usuarios (
+                    nombre, email, telefono, redes_sociales, fecha_nacimiento,
+                    genero, ocupacion, deportes, presupuesto_maximo, habitos_limpieza,
+                    horario_trabajo, tiene_mascota, acepta_mascota, es_fumador,
+                    acepta_fumador, intereses, preferencias_roommate, fecha_registro,
+                    ultima_actualizacion, activo
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                list(user_data.values())
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            list(user_data.values())
-        )
-        new_id = self.cursor.lastrowid         # Obtener el último ID insertado
-        self.conn.commit()  # Confirmar la transacción
-        return new_id
-    except sqlite3.IntegrityError as e:
-        raise ValueError(f"Error al insertar el usuario: {e}")
+            new_id = self.cursor.lastrowid         # Obtener el último ID insertado
+            self.conn.commit()  # Confirmar la transacción
+            return new_id
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Error al insertar el usuario: {e}")
     
     def update_user(self, user_id: int, user_data: Dict[str, Any]) -> bool:
         """
@@ -256,7 +297,7 @@ def insert_user(self, user_data: Dict[str, Any]) -> int:
         Returns:
             Tupla con los datos del usuario o None si no se encuentra.
         """
-        return self.fetch_one("SELECT * FROM usuarios WHERE email = ?", (email,))
+        return self.fetch_one(SELECT_USER_BY_EMAIL, (email,))
 
     def mail_exist(self, email: str) -> bool:
         """
@@ -279,7 +320,7 @@ def insert_user(self, user_data: Dict[str, Any]) -> int:
         Returns:
             Lista de tuplas con los datos de los usuarios activos.
         """
-        return self.fetch_all("SELECT * FROM usuarios WHERE activo = 1")
+        return self.fetch_all(SELECT_ACTIVE_USERS)
 
     def get_active_users_id(self) -> List[int]:
         """
@@ -291,8 +332,7 @@ def insert_user(self, user_data: Dict[str, Any]) -> int:
         if not self.conn:
             self.connect()
 
-        query = "SELECT id FROM usuarios WHERE activo = 1"  # Selecciona solo los IDs de usuarios activos
-        self.cursor.execute(query)
+        self.cursor.execute(SELECT_ACTIVE_USER_IDS)  # Selecciona solo los IDs de usuarios activos
         results = self.cursor.fetchall()  # Obtiene todos los resultados
         list_id = [row[0] for row in results]  # Extrae los IDs de las filas
         return list_id
@@ -353,27 +393,10 @@ def insert_user(self, user_data: Dict[str, Any]) -> int:
         Returns:
             Lista de tuplas con los usuarios recomendados y sus puntuaciones.
         """
-        query = """
-        WITH all_similarities AS (
-            SELECT user_id_1 AS user_id, user_id_2 AS other_user_id, score_similitud
-            FROM similitudes
-            WHERE user_id_1 = ?
-            UNION ALL
-            SELECT user_id_2 AS user_id, user_id_1 AS other_user_id, score_similitud
-            FROM similitudes
-            WHERE user_id_2 = ?
-        )
-        SELECT u.*, s.score_similitud
-        FROM all_similarities s
-        JOIN usuarios u ON u.user_id = s.other_user_id
-        WHERE u.activo = 1
-        ORDER BY s.score_similitud DESC
-        LIMIT ?
-        """
-        
-        return self.fetch_all(query, (user_id, user_id, limit))
+        return self.fetch_all(SELECT_RECOMMENDATIONS, (user_id, user_id, limit))
     
-    def calculate_similarity(self, user1: tuple, user2: tuple) -> float:
+    @staticmethod
+    def calculate_similarity(user1: tuple, user2: tuple) -> float:
         """
         Calcula la puntuación de similitud entre dos usuarios.
         
@@ -413,11 +436,11 @@ def insert_user(self, user_data: Dict[str, Any]) -> int:
             score += 1.0
 
         # Ocupación [parametro 7]
-        if user1[7] and user2[7] and self._compare_string_words(user1[7], user2[7]):
+        if user1[7] and user2[7] and DBManager._compare_string_words(user1[7], user2[7]):
             score += 2.0
 
         # Deportes [parametro 8]
-        if user1[8] and user2[8] and self._compare_string_words(user1[8], user2[8]):
+        if user1[8] and user2[8] and DBManager._compare_string_words(user1[8], user2[8]):
             score += 2.0
 
         # Presupuesto [parametro 9]
@@ -467,7 +490,7 @@ def insert_user(self, user_data: Dict[str, Any]) -> int:
             intereses1 = json.loads(user1[16]) if user1[16] else []  # Si user1[16] es None o una cadena vacía, inicializar intereses1 como una lista vacía.
             intereses2 = json.loads(user2[16]) if user2[16] else []  # Lo mismo para intereses2
 
-            if intereses1 and intereses2 and self._compare_string_words(intereses1, intereses2):
+            if intereses1 and intereses2 and DBManager._compare_string_words(intereses1, intereses2):
                 score += 2.0
         except (json.JSONDecodeError, TypeError):
             pass  # Ignora si los intereses no son un JSON válido o si no están presentes
@@ -477,14 +500,15 @@ def insert_user(self, user_data: Dict[str, Any]) -> int:
             preferencias1 = json.loads(user1[17]) if user1[17] else {}
             preferencias2 = json.loads(user2[17]) if user2[17] else {}
 
-            if preferencias1 and preferencias2 and self._compare_string_words(preferencias1, preferencias2):
+            if preferencias1 and preferencias2 and DBManager._compare_string_words(preferencias1, preferencias2):
                 score += 2.0
         except (json.JSONDecodeError, TypeError):
             pass  # Ignora si las preferencias no son un JSON válido o si no están presentes
 
         return score
     
-    def _compare_string_words(self, str1: Union[str, list, dict], str2: Union[str, list, dict]) -> bool:
+    @staticmethod
+    def _compare_string_words(str1: Union[str, list, dict], str2: Union[str, list, dict]) -> bool:
         """
         Compara dos cadenas de texto (o listas/diccionarios) y busca palabras en común.
         
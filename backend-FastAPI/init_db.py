@@ -5,6 +5,7 @@ from datetime import datetime
 
 # Importar la clase DBManager
 from db_manager import DBManager
+from migrations import apply_migrations
 
 # Initialize Faker
 fake = Faker()
@@ -67,5 +68,9 @@ def main():
         similarities_count = db.calculate_all_similarities()
         print(f"Se calcularon {similarities_count} recomendaciones entre usuarios")
 
+        # Crear índices y actualizar estadísticas con los datos ya cargados
+        applied = apply_migrations(db)
+        print(f"Se aplicaron {applied} migraciones de esquema")
+
 if __name__ == "__main__":
     main()
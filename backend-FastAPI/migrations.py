@@ -0,0 +1,146 @@
+import sqlite3
+import sys
+from typing import List, Dict, Tuple
+
+from db_manager import (
+    DBManager,
+    SELECT_USER_BY_EMAIL,
+    SELECT_ACTIVE_USER_IDS,
+    SELECT_RECOMMENDATIONS,
+    SIMILARITY_INDEXES,
+)
+
+# Lista ordenada de migraciones: (versión, descripción, sentencias SQL).
+# Nunca modificar una migración ya publicada; agregar una nueva versión.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "Índices para consultas frecuentes", [
+        # Parcial y cubriente para get_active_users_id (en cada alta): guarda solo
+        # (activo, rowid) de los activos, así se leen los IDs sin tocar las filas
+        """
+        CREATE INDEX IF NOT EXISTS idx_usuarios_activos
+        ON usuarios(activo) WHERE activo = 1
+        """,
+        # Cubrientes para ambas ramas de get_recommendations (ver SIMILARITY_INDEXES)
+        *[
+            f"CREATE INDEX IF NOT EXISTS {name} ON similitudes{columns}"
+            for name, columns in SIMILARITY_INDEXES.items()
+        ],
+    ]),
+]
+
+# Consultas calientes de DBManager con parámetros de ejemplo para EXPLAIN QUERY PLAN.
+# El email de mail_exist queda cubierto por el índice automático del UNIQUE.
+# get_active_users no se verifica: devuelve casi toda la tabla y su SCAN es intencional.
+HOT_QUERIES: Dict[str, Tuple[str, tuple]] = {
+    "mail_exist": (SELECT_USER_BY_EMAIL, ("ejemplo@ejemplo.com",)),
+    "get_active_users_id": (SELECT_ACTIVE_USER_IDS, ()),
+    "get_recommendations": (SELECT_RECOMMENDATIONS, (1, 1, 5)),
+}
+
+
+def get_schema_version(db: DBManager) -> int:
+    """
+    Obtiene la versión de esquema aplicada en la base de datos.
+
+    Args:
+        db: Gestor de base de datos conectado.
+
+    Returns:
+        Última versión aplicada o 0 si no hay migraciones registradas.
+    """
+    db.execute_query('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        descripcion TEXT,
+        fecha_aplicacion TEXT
+    )
+    ''')
+    row = db.fetch_one("SELECT MAX(version) FROM schema_version")
+    return row[0] if row and row[0] is not None else 0
+
+
+def apply_migrations(db: DBManager) -> int:
+    """
+    Aplica las migraciones pendientes, registra su versión y actualiza las
+    estadísticas del planificador con ANALYZE.
+
+    Args:
+        db: Gestor de base de datos. Las tablas deben existir (create_tables).
+
+    Returns:
+        Número de migraciones aplicadas.
+    """
+    current = get_schema_version(db)
+    applied = 0
+
+    for version, descripcion, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            # Cada migración es atómica: sus índices y su registro de versión
+            db.cursor.execute("BEGIN")
+            for statement in statements:
+                db.cursor.execute(statement)
+            db.cursor.execute(
+                "INSERT INTO schema_version (version, descripcion, fecha_aplicacion) "
+                "VALUES (?, ?, datetime('now'))",
+                (version, descripcion)
+            )
+            db.conn.commit()
+            applied += 1
+        except sqlite3.Error as e:
+            db.conn.rollback()
+            raise Exception(f"Error al aplicar migración {version}: {e}")
+
+    # Sin estadísticas el planificador puede preferir un SCAN sobre los índices nuevos
+    db.execute_query("ANALYZE")
+    return applied
+
+
+def check_query_plans(db: DBManager) -> Dict[str, List[str]]:
+    """
+    Ejecuta EXPLAIN QUERY PLAN sobre cada consulta caliente y falla si alguna
+    recorre una tabla completa. No depende de los nombres de los índices, que
+    rebuild.py alterna en cada reconstrucción.
+
+    Args:
+        db: Gestor de base de datos con las migraciones aplicadas.
+
+    Returns:
+        Diccionario con el plan (lista de pasos) de cada consulta.
+
+    Raises:
+        Exception: Si algún plan contiene un SCAN.
+    """
+    plans = {}
+    scans = []
+
+    for name, (query, params) in HOT_QUERIES.items():
+        rows = db.fetch_all(f"EXPLAIN QUERY PLAN {query}", params)
+        plans[name] = [row[3] for row in rows]
+        scans.extend(f"{name}: {detail}" for detail in plans[name] if detail.startswith("SCAN"))
+
+    if scans:
+        raise Exception("Consultas con recorrido completo:\n" + "\n".join(scans))
+    return plans
+
+
+def main():
+    """Aplica las migraciones a la base de datos predeterminada y verifica los planes."""
+    with DBManager() as db:
+        db.create_tables()
+        applied = apply_migrations(db)
+        print(f"Se aplicaron {applied} migraciones (versión {get_schema_version(db)})")
+
+        try:
+            plans = check_query_plans(db)
+        except Exception as e:
+            print(e)
+            sys.exit(1)
+
+        for name, steps in plans.items():
+            print(f"{name}: {'; '.join(steps)}")
+
+
+if __name__ == "__main__":
+    main()